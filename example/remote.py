@@ -0,0 +1,112 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Check loading example/lazy from a local HTTP stand-in through the cache,
+and that a malformed reference file stops the validation
+
+Usage:
+
+python example/remote.py
+"""
+
+#import libraries
+import sys
+from os import chdir, stat
+from os.path import dirname, abspath, isfile
+from shutil import rmtree
+from tempfile import mkdtemp
+from threading import Thread
+from BaseHTTPServer import HTTPServer
+from SimpleHTTPServer import SimpleHTTPRequestHandler
+
+__EXAMPLE__ = dirname(abspath(__file__))
+sys.path.insert(0, dirname(__EXAMPLE__))
+from validata import Validata, ConfigError
+
+class StandIn(SimpleHTTPRequestHandler):
+    """Serve example/lazy with ETag (if enabled) and Last-Modified, and log each request"""
+    log = []
+    status = 200
+    etag = True
+    def translate_path(self, path):
+        return __EXAMPLE__ + '/lazy' + path.split('?')[0]
+    def do_GET(self):
+        path = self.translate_path(self.path)
+        if StandIn.status != 200:
+            code = StandIn.status
+        elif not isfile(path):
+            code = 404
+        else:
+            st = stat(path)
+            etag = '"%i-%i"' % (st.st_mtime, st.st_size)
+            modified = self.date_time_string(st.st_mtime)
+            if StandIn.etag:
+                code = 304 if self.headers.getheader('If-None-Match') == etag else 200
+            else:
+                code = 304 if self.headers.getheader('If-Modified-Since') == modified else 200
+        StandIn.log.append((self.path, code))
+        if code != 200:
+            return self.send_error(code)
+        with open(path, 'r') as f:
+            content = f.read()
+        self.send_response(200)
+        if StandIn.etag:
+            self.send_header('ETag', etag)
+        self.send_header('Last-Modified', modified)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+    def log_message(self, format, *args):
+        pass
+
+def check(name, expect, cachedir):
+    """Load the config from the stand-in and compare the requests with the expected ones."""
+    StandIn.log = []
+    validata = Validata(url + '/config.yaml', cachedir)
+    valid = validata.check_file(__EXAMPLE__ + '/lazy/data.txt')
+    log = sorted(StandIn.log)
+    if not valid or log != sorted(expect):
+        print 'Failed: %s, valid: %s, requests: %s' % (name, valid, log)
+        return False
+    print 'Passed: %s' % name
+    return True
+
+def check_broken(name, config, cachedir):
+    """Make sure the malformed reference file stops the validation once instead of failing every line."""
+    validata = Validata(config, cachedir)
+    try:
+        validata.check_file(__EXAMPLE__ + '/lazy/data.txt')
+    except ConfigError as e:
+        print 'Passed: %s, %s' % (name, e)
+        return True
+    print 'Failed: %s, no error is raised' % name
+    return False
+
+if __name__ == "__main__":
+    server = HTTPServer(('127.0.0.1', 0), StandIn)
+    Thread(target = server.serve_forever).start()
+    url = 'http://127.0.0.1:%i' % server.server_port
+    tmpdir = mkdtemp()
+    cachedir = tmpdir + '/cache'
+    chdir(tmpdir)
+    passed = True
+    try:
+        files = ['/config.yaml', '/common.yaml', '/color.txt']
+        passed &= check('fetch', [(f, 200) for f in files], cachedir)
+        passed &= check('revalidate', [(f, 304) for f in files], cachedir)
+        StandIn.etag = False
+        passed &= check('fetch without etag', [(f, 200) for f in files], tmpdir + '/cache-modified')
+        passed &= check('revalidate by last modified', [(f, 304) for f in files], tmpdir + '/cache-modified')
+        StandIn.etag = True
+        passed &= check_broken('malformed', __EXAMPLE__ + '/lazy/broken.yaml', cachedir)
+        passed &= check_broken('malformed remote', url + '/broken.yaml', cachedir)
+        StandIn.status = 503
+        passed &= check('unavailable', [(f, 503) for f in files], cachedir)
+    finally:
+        server.shutdown()
+        server.server_close()
+    try:
+        passed &= check('offline', [], cachedir)
+    finally:
+        rmtree(tmpdir)
+    if not passed:
+        sys.exit('Remote check failed!')
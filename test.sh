@@ -1,3 +1,5 @@
 python validata.py example/valid/tw_movie.yaml example/valid/tw_movie.txt
 python validata.py example/valid/yk_movie.yaml example/valid/yk_movie.txt
 python validata.py example/invalid/config.yaml example/invalid/data.txt
+python validata.py example/lazy/config.yaml example/lazy/data.txt
+python example/remote.py
@@ -19,6 +19,8 @@ validata.check_file(filename)
 #define constants
 __VALIDATA_ROOT__ = '/usr/local/validata'
 __VALIDATA_ETC__ = __VALIDATA_ROOT__ + '/etc'
+__VALIDATA_CACHE__ = '~/.cache/validata'
+__URL_TIMEOUT__ = 10
 __HISTORY_LOG__ = 'http://54.186.241.214/history.html'
 __HISTORY_API__ = 'http://54.186.241.214/cgi-bin/api.py'
 
@@ -26,10 +28,16 @@ __HISTORY_API__ = 'http://54.186.241.214/cgi-bin/api.py'
 import re
 import yaml
 from sys import exit, argv
-from os.path import isfile, dirname, abspath
+from os import makedirs, rename, remove, fdopen, stat, getuid
+from os.path import isfile, isdir, dirname, abspath, expanduser
 from datetime import datetime
+from hashlib import sha1
+from tempfile import mkstemp
+from socket import timeout
+from StringIO import StringIO
+from httplib import HTTPException
 from urllib import urlencode
-from urllib2 import urlopen
+from urllib2 import urlopen, Request, HTTPError
 
 #@debug
 def debug(func):
@@ -192,16 +200,74 @@ class GroupRule(Rule):
             me[line] = 1
         return True
 
+class Reference:
+    """A predefined list of values that is loaded from a reference file on first use.
+    Args:
+        filename (str): The reference filename or URL
+        pathlist (list): A list of path to search
+        validata (Validata): The parrent Validata object
+    """
+    def __init__(self, filename, pathlist, validata):
+        self.filename = filename
+        self.pathlist = pathlist
+        self.validata = validata
+        self.filepath = None
+        self.file = None
+        self.values = None
+        self.error = None
+    def __repr__(self):
+        return 'ref: ' + self.filename
+    def __contains__(self, value):
+        if self.values is None:
+            self.load()
+        return value in self.values
+    def find(self):
+        """Make sure the reference file exists without reading its content.
+        Raises:
+            ConfigError: The reference file can not be found or fetched.
+        """
+        try:
+            (f, self.filepath) = self.validata.find_file(self.filename, self.pathlist)
+        except (FileNotFoundError, IOError, HTTPException):
+            raise ConfigError('Unable to read reference file "%s" in path "%s"!' % (self.filename, ':'.join(self.pathlist)))
+        #content fetched from URL is kept to be read later
+        if self.validata.is_url(self.filepath):
+            self.file = f
+        else:
+            f.close()
+    def load(self):
+        """Read the values from the reference file, a failed load will not be retried.
+        Raises:
+            ConfigError: The reference file can not be read or decoded.
+        """
+        if self.error:
+            raise self.error
+        try:
+            f = self.file if self.file else open(self.filepath, 'r')
+            self.file = None
+            lines = f.read().splitlines()
+            f.close()
+            self.values = set(x.decode('utf8') for x in lines if x != '')
+        except (IOError, UnicodeDecodeError) as e:
+            self.error = ConfigError('Failed to load reference file "%s"! %s' % (self.filename, e))
+            raise self.error
+        print 'Reference file "%s" loaded.' % self.filename
+
 class Validata:
     """Validate loads config from a yaml file and compile them into Rule objects.
+    Only the rules and references reachable from rule "all" are compiled, and
+    reference files are loaded on first use.
     Args:
         filename (str): The config file name
+        cachedir (str): The directory to cache files fetched from URL
     Raises:
         ConfigError: Something wrong in the config file that must be fixed.
     """
-    def __init__(self, filename):
+    def __init__(self, filename, cachedir = __VALIDATA_CACHE__):
         self.version = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         self.logfile = None
+        self.cachedir = expanduser(cachedir)
+        self.cacheok = None
         self.include = set()
         self.range = None
         self.rules = rules = {}
@@ -210,17 +276,17 @@ class Validata:
         self.group = {}
         self.config = cfg = self.load_config(filename)
 
-        #compile config into rules
-        for key in cfg:
+        #compile rules reachable from "all" into rules
+        for key in self.find_reachable('all'):
             if key in rules:
                 continue
-            #ignore keywords
-            if key[:2] == '__':
-                continue
             #constants
             if key[:1] == '_':
                 if isinstance(cfg[key], list):
                     rules[key] = set(cfg[key])
+                elif isinstance(cfg[key], Reference):
+                    cfg[key].find()
+                    rules[key] = cfg[key]
                 else:
                     pass #todo
                 continue
@@ -284,15 +350,124 @@ class Validata:
         Returns:
             (file, str): File object and the absolute path of the file.
         """
-        if filename.startswith('http://') or filename.startswith('https://'):
-            return (urlopen(filename), filename)
+        if self.is_url(filename):
+            return (self.open_url(filename), filename)
         for path in [''] + pathlist:
+            #find the file relative to a remote config file
+            if self.is_url(path):
+                try:
+                    return (self.open_url(path + '/' + filename), path + '/' + filename)
+                except HTTPError as e:
+                    if e.code != 404:
+                        raise
+                    continue
             filepath = abspath(path + '/' + filename)
             if isfile(filepath):
                 f = open(filepath, 'r')
                 return (f, filepath)
         raise FileNotFoundError(filename, pathlist)
 
+    def is_url(self, filename):
+        """Check if the filename is a URL.
+        Args:
+            filename (str): Filename in relative or absolute path or URL.
+        Returns:
+            bool: True if the filename starts with http:// or https://.
+        """
+        return filename.startswith('http://') or filename.startswith('https://')
+
+    def get_cachedir(self):
+        """Create the cache directory on first use and make sure it is owned by current user.
+        Returns:
+            str: The cache directory, or None if it can not be used.
+        """
+        if self.cacheok is None:
+            self.cacheok = False
+            try:
+                if not isdir(self.cachedir):
+                    makedirs(self.cachedir, 0700)
+                if stat(self.cachedir).st_uid != getuid():
+                    print 'Warning: Cache directory "%s" is not owned by current user!' % self.cachedir
+                else:
+                    self.cacheok = True
+            except OSError:
+                print 'Warning: Failed to create cache directory "%s"!' % self.cachedir
+        return self.cachedir if self.cacheok else None
+
+    def write_cache(self, filename, content):
+        """Write the content into a unique temporary file then rename it to the cache file.
+        Args:
+            filename (str): The cache file name.
+            content (str): The content to write.
+        """
+        (fd, tmpname) = mkstemp(dir = dirname(filename))
+        try:
+            with fdopen(fd, 'w') as f:
+                f.write(content)
+            rename(tmpname, filename)
+        except:
+            remove(tmpname)
+            raise
+
+    def open_url(self, url):
+        """Open the URL through the local cache. The cached copy is revalidated with ETag and
+        Last-Modified, and is used as is if the server is unreachable or unavailable.
+        Args:
+            url (str): The URL to open.
+        Returns:
+            file: File object of the content.
+        """
+        cachedir = self.get_cachedir()
+        cache = cachedir + '/' + sha1(url).hexdigest() if cachedir else None
+        cached = cache is not None and isfile(cache)
+        meta = {}
+        if cached and isfile(cache + '.meta'):
+            try:
+                with open(cache + '.meta', 'r') as f:
+                    meta = yaml.safe_load(f) or {}
+                with open(cache, 'r') as f:
+                    #ignore the meta if it was written for another content
+                    if meta.get('sha1') != sha1(f.read()).hexdigest():
+                        meta = {}
+            except:
+                meta = {}
+        request = Request(url)
+        if 'etag' in meta:
+            request.add_header('If-None-Match', meta['etag'])
+        if 'last_modified' in meta:
+            request.add_header('If-Modified-Since', meta['last_modified'])
+        try:
+            response = urlopen(request, timeout = __URL_TIMEOUT__)
+            content = response.read()
+            headers = response.info()
+            response.close()
+        except HTTPError as e:
+            if e.code == 304 and cached:
+                return open(cache, 'r')
+            if e.code < 500 or not cached:
+                raise
+            print 'Warning: Unable to fetch "%s" (HTTP %i), use cached file instead!' % (url, e.code)
+            return open(cache, 'r')
+        except (IOError, HTTPException, timeout):
+            if not cached:
+                raise
+            print 'Warning: Unable to fetch "%s", use cached file instead!' % url
+            return open(cache, 'r')
+
+        #update cache
+        if cache:
+            meta = {'url': url, 'sha1': sha1(content).hexdigest()}
+            if headers.getheader('ETag'):
+                meta['etag'] = headers.getheader('ETag')
+            if headers.getheader('Last-Modified'):
+                meta['last_modified'] = headers.getheader('Last-Modified')
+            try:
+                self.write_cache(cache, content)
+                self.write_cache(cache + '.meta', yaml.safe_dump(meta))
+            except (IOError, OSError):
+                print 'Warning: Failed to write cache file "%s"!' % cache
+        return StringIO(content)
+
     def load_config(self, filename, basedir = '.'):
         """Load config file recursively.
         Args:
@@ -318,7 +493,8 @@ class Validata:
         if '__logfile' in cfg:
             logfile = cfg['__logfile']
             if logfile[0] != '/':
-                logfile = basedir + '/' + logfile
+                #log file of a remote config file is kept in current directory
+                logfile = abspath(logfile) if self.is_url(basedir) else basedir + '/' + logfile
             self.logfile = logfile
 
         #check if there's any external reference
@@ -329,12 +505,8 @@ class Validata:
             elif key[:1] == '_':
                 if isinstance(cfg[key], list):
                     continue
-                #load external reference
-                refname = cfg[key]
-                (f, filepath) = self.find_file(refname, [basedir, __VALIDATA_ETC__])
-                cfg[key] = [x.rstrip('\r\n').decode('utf8') for x in f if x.rstrip('\r\n') != '']
-                f.close()
-                print 'Reference file "%s" loaded.' % refname
+                #external reference will be loaded on first use
+                cfg[key] = Reference(cfg[key], [basedir, __VALIDATA_ETC__], self)
 
         #load include file(s)
         if '__include' in cfg:
@@ -351,6 +523,50 @@ class Validata:
         print 'Config file "%s" loaded.' % filename
         return cfg
 
+    def find_reachable(self, key):
+        """Find the keys that a rule depends on through references and named groups.
+        Args:
+            key (str): The key of the rule to start from.
+        Returns:
+            set: Keys reachable from the rule, including itself.
+        """
+        cfg = self.config
+        reachable = set()
+        keys = [key]
+        while keys:
+            key = keys.pop()
+            if key in reachable or key not in cfg or key[:2] == '__':
+                continue
+            reachable.add(key)
+            #constants have no dependency
+            if key[:1] != '_':
+                keys += self.find_keys(cfg[key])
+        return reachable
+
+    def find_keys(self, cmd):
+        """Find the keys used by the command(s) directly.
+        Args:
+            cmd (str, list): Command(s), regular expression pattern(s) or reference(s).
+        Returns:
+            list: Referenced keys and the names of the groups in the pattern(s).
+        """
+        if isinstance(cmd, dict):
+            keys = []
+            if 'as' in cmd:
+                keys += self.find_keys(cmd['as'])
+            if 'find' in cmd:
+                keys += self.find_keys(cmd['find'])
+            if 'split' in cmd and isinstance(cmd['split'], dict) and 'as' in cmd['split']:
+                keys += self.find_keys(cmd['split']['as'])
+            return keys
+        if isinstance(cmd, list):
+            return sum((self.find_keys(c) for c in cmd), [])
+        if not isinstance(cmd, basestring) or cmd == '':
+            return []
+        if cmd[0] == '$':
+            return [cmd[1:]]
+        return re.findall(r'\(\?P<(\w+)>', cmd)
+
     def compile_rule(self, cmd):
         """Compile regular expression rule(s).
         Args:
@@ -524,6 +740,9 @@ class Validata:
                     break
                 try:
                     self.check_line(line)
+                except ConfigError:
+                    #stop validating the file with a broken config
+                    raise
                 except Exception as e:
                     if error < 3:
                          print 'Validation failed on file "%s",  line %i:\n%s' % (filename, i, e)
@@ -581,7 +800,11 @@ if __name__ == "__main__":
     failed = False
     for i in range(2, len(argv)):
         filename = argv[i]
-        if validata.check_file(filename):
+        try:
+            valid = validata.check_file(filename)
+        except ConfigError as e:
+            exit(e)
+        if valid:
             print 'File "%s" is valid.' % filename
         else:
             print 'File "%s" is invalid.' % filename